@@ -1,4 +1,4 @@
-import os, re, shlex, subprocess, time
+import os, re, selectors, shlex, subprocess, time
 from .config import Config
 
 # --- generic helpers already used elsewhere ---
@@ -8,11 +8,57 @@ def ensure_dirs(path: str):
 def ts() -> str:
     return time.strftime("%Y%m%d-%H%M%S")
 
+# We only ever report the last 4000 chars of each stream, so never buffer
+# more than that: drain the pipes chunk-wise into rolling tails.
+_TAIL_BYTES = 4000
+
+def _run_capture_tail(argv: list, timeout: int = 180):
+    """Run argv, returning (rc, stdout_tail, stderr_tail) with each stream
+    bounded to _TAIL_BYTES — a command that dumps megabytes costs constant
+    memory instead of a full capture_output allocation."""
+    p = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    tails = {p.stdout: bytearray(), p.stderr: bytearray()}
+    sel = selectors.DefaultSelector()
+    sel.register(p.stdout, selectors.EVENT_READ)
+    sel.register(p.stderr, selectors.EVENT_READ)
+    deadline = time.time() + timeout
+    try:
+        while sel.get_map():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                p.kill()
+                raise subprocess.TimeoutExpired(argv, timeout)
+            for key, _ in sel.select(remaining):
+                chunk = key.fileobj.read1(65536)
+                if not chunk:
+                    sel.unregister(key.fileobj)
+                    continue
+                tail = tails[key.fileobj]
+                tail += chunk
+                if len(tail) > _TAIL_BYTES:
+                    del tail[:len(tail) - _TAIL_BYTES]
+        rc = p.wait(max(0.0, deadline - time.time()))
+    finally:
+        sel.close()
+    out = tails[p.stdout].decode("utf-8", "ignore")
+    err = tails[p.stderr].decode("utf-8", "ignore")
+    return rc, out, err
+
+def run_argv(argv: list[str]) -> dict:
+    """Run a pre-split argv. Internal callers build their commands from
+    known templates, so they can skip the shlex state machine entirely;
+    run_cmd stays for user/model-supplied command strings."""
+    cmd = " ".join(argv)
+    try:
+        rc, out, err = _run_capture_tail(argv)
+        return {"cmd": cmd, "rc": rc, "stdout": out, "stderr": err}
+    except Exception as e:
+        return {"cmd": cmd, "rc": -1, "stdout": "", "stderr": str(e)}
+
 def run_cmd(cmd: str) -> dict:
     try:
-        parts = shlex.split(cmd)
-        p = subprocess.run(parts, capture_output=True, text=True, timeout=180)
-        return {"cmd": cmd, "rc": p.returncode, "stdout": p.stdout[-4000:], "stderr": p.stderr[-4000:]}
+        rc, out, err = _run_capture_tail(shlex.split(cmd))
+        return {"cmd": cmd, "rc": rc, "stdout": out, "stderr": err}
     except Exception as e:
         return {"cmd": cmd, "rc": -1, "stdout": "", "stderr": str(e)}
 
@@ -35,15 +81,29 @@ def parse_systemctl(cmd: str):
     action, service = m.group(1), m.group(2)
     return action, service
 
+# path -> (st_mtime_ns, parsed set); avoids re-reading the whitelist file
+# on every approval when --auto runs in a live loop.
+_WL_CACHE: dict = {}
+
 def _load_whitelist(path: str) -> set[str]:
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        _WL_CACHE.pop(path, None)
+        return set()
+    cached = _WL_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
     try:
         with open(path, "r") as f:
-            return {
+            wl = {
                 ln.strip() for ln in f
                 if ln.strip() and not ln.strip().startswith("#")
             }
     except Exception:
         return set()
+    _WL_CACHE[path] = (mtime, wl)
+    return wl
 
 def approve_fix_cmd(cmd: str, cfg: Config) -> bool:
     """
@@ -71,22 +131,28 @@ def approve_fix_cmd(cmd: str, cfg: Config) -> bool:
         return True
     return False
 
+def _is_active_state(service: str) -> dict:
+    p = subprocess.run(["systemctl", "is-active", service], capture_output=True, text=True)
+    return {"stdout": (p.stdout or "").strip(), "stderr": (p.stderr or "").strip(), "rc": p.returncode}
+
 def restart_service_and_verify(service: str, cfg: Config) -> dict:
     """
-    Restart the service and verify it becomes 'active' within a timeout window.
+    Restart the service and verify it becomes 'active'.
+
+    `systemctl restart` already blocks until the start job completes, so
+    one is-active readback normally settles it; we only keep polling for
+    units that are still 'activating' (e.g. Type=notify warming up),
+    instead of forking is-active every interval unconditionally.
     """
-    res_restart = run_cmd(f"systemctl restart {service}")
-    # Even if restart rc != 0, try to verify current state to give more info.
-    deadline = time.time() + cfg.auto_verify_timeout
-    interval = max(1, cfg.auto_verify_interval)
-    last_state = {"stdout": "", "stderr": "", "rc": 1}
-
-    while time.time() < deadline:
-        p = subprocess.run(["systemctl", "is-active", service], capture_output=True, text=True)
-        last_state = {"stdout": (p.stdout or "").strip(), "stderr": (p.stderr or "").strip(), "rc": p.returncode}
-        if p.returncode == 0 and last_state["stdout"] == "active":
-            break
-        time.sleep(interval)
+    res_restart = run_argv(["systemctl", "restart", service])
+    # Even if restart rc != 0, read the current state to give more info.
+    last_state = _is_active_state(service)
+    if last_state["stdout"] == "activating":
+        deadline = time.time() + cfg.auto_verify_timeout
+        interval = max(1, cfg.auto_verify_interval)
+        while time.time() < deadline and last_state["stdout"] == "activating":
+            time.sleep(interval)
+            last_state = _is_active_state(service)
 
     out = {
         "cmd": f"systemctl restart {service}",
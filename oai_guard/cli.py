@@ -1,28 +1,49 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import argparse, os
+import argparse, mmap, os
 from typing import List, Tuple
 from .model import Config
+from .sources import scan_file_once
 from .triage import handle_error
+from . import history
 
 def read_last_error_with_context(path: str, window: int = 30) -> Tuple[str, List[str]]:
-    with open(path, "r", errors="ignore") as f:
-        lines = f.readlines()
-    idx = None
-    for i in range(len(lines) - 1, -1, -1):
-        if "ERROR" in lines[i]:
-            idx = i; break
-    if idx is None:
-        raise SystemExit("No ERROR line found in the log.")
-    start = max(0, idx - (window - 1))
-    return lines[idx].rstrip("\n"), [l.rstrip("\n") for l in lines[start:idx+1]]
+    """Last ERROR line plus up to `window` trailing context lines.
+
+    The log is mmap'd and the last ERROR located with mm.rfind — a C
+    memmem scan, microseconds even on multi-GB files — then the context
+    window is carved out by walking newlines backward. Only the matched
+    slice is ever decoded into Python strings.
+    """
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise SystemExit("No ERROR line found in the log.")
+        with mm:
+            idx = mm.rfind(b"ERROR")
+            if idx < 0:
+                raise SystemExit("No ERROR line found in the log.")
+            line_start = mm.rfind(b"\n", 0, idx) + 1
+            line_end = mm.find(b"\n", idx)
+            if line_end < 0:
+                line_end = len(mm)
+            start = line_start
+            for _ in range(window - 1):
+                if start == 0:
+                    break
+                start = mm.rfind(b"\n", 0, start - 1) + 1
+            err = mm[line_start:line_end].decode("utf-8", "ignore")
+            ctx = mm[start:line_end].decode("utf-8", "ignore").splitlines()
+            return err, ctx
 
 def main():
     ap = argparse.ArgumentParser("oai-guard (OpenAI-powered)")
     ap.add_argument("logfile", help="Path to log file")
     ap.add_argument("--window", type=int, default=30, help="Context lines to include (tail)")
     ap.add_argument("--last", action="store_true", help="Analyze only the last ERROR line")
+    ap.add_argument("--once", action="store_true", help="Scan the whole file once, triaging every error event")
     ap.add_argument("--auto", action="store_true", help="Attempt safe auto-resolution (policy constrained)")
     ap.add_argument("--no-heur", dest="no_heur", action="store_true", help="Disable heuristic fast-path (force model JSON)")
     ap.add_argument("--engine", default=os.environ.get("OAI_ENGINE", "openai"),
@@ -52,9 +73,19 @@ def main():
         ollama_opts_json=args.ollama_opts,
     )
 
-    err, ctx = read_last_error_with_context(args.logfile, args.window)
     heur_state = 'OFF' if args.no_heur else 'ON'
     print(f"[oai-guard] engine={cfg.engine} model={cfg.openai_model if cfg.engine=='openai' else cfg.ollama_model} heuristics={heur_state}")
+
+    if args.once:
+        events = scan_file_once(args.logfile, args.window)
+        print(f"[+] Found {len(events)} error events")
+        # Batch all history writes into one commit instead of one per event.
+        with history.transaction():
+            for line, ctx, kv in events:
+                handle_error(line, ctx, cfg, auto=args.auto, use_heuristics=not args.no_heur, kv=kv)
+        return
+
+    err, ctx = read_last_error_with_context(args.logfile, args.window)
     if args.last:
         print("[+] Last error:"); print(err)
         print(f"[+] Context lines: {len(ctx)}")
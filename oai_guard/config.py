@@ -4,24 +4,42 @@ import os
 def _split_allowlist(s: str):
     return [p.strip() for p in s.split(",") if p.strip()]
 
+# Environment is resolved once at import; Config() then just copies these
+# instead of re-running ~14 getenv + cast/split operations per instance.
+_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+_INCIDENT_DIR = os.getenv("INCIDENT_DIR", "/var/log/oai_incidents")
+_CONTEXT_LINES = int(os.getenv("CONTEXT_LINES", "50"))
+_TAIL_N = int(os.getenv("TAIL_N", "0"))
+_TIMEOUT_SEC = int(os.getenv("OLLAMA_TIMEOUT", "120"))
+_WINDOW = int(os.getenv("WINDOW", "800"))
+_ALLOWLIST = _split_allowlist(
+    os.getenv("ALLOWLIST", "systemctl status,systemctl restart,journalctl -u,grep,tail")
+)
+_KEEP_ALIVE = os.getenv("KEEP_ALIVE", "-1")
+_FAST_FIRST = os.getenv("FAST_FIRST", "1").lower() not in ("0", "false", "no")
+_SKIP_DIAG = os.getenv("SKIP_DIAG", "0").lower() in ("1", "true", "yes")
+_AUTO_POLICY = os.getenv("AUTO_POLICY", "oai_only")  # 'oai_only'|'whitelist'|'any'
+_WHITELIST_FILE = os.getenv("WHITELIST_FILE", "/etc/oai-guard-whitelist.txt")
+_AUTO_VERIFY_TIMEOUT = int(os.getenv("AUTO_VERIFY_TIMEOUT", "20"))
+_AUTO_VERIFY_INTERVAL = int(os.getenv("AUTO_VERIFY_INTERVAL", "2"))
+
 @dataclass(frozen=True)
 class Config:
-    model: str = field(default_factory=lambda: os.getenv("OLLAMA_MODEL", "llama3.2"))
-    base_url: str = field(default_factory=lambda: os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/"))
-    incident_dir: str = field(default_factory=lambda: os.getenv("INCIDENT_DIR", "/var/log/oai_incidents"))
-    context_lines: int = field(default_factory=lambda: int(os.getenv("CONTEXT_LINES", "50")))
-    tail_n: int = field(default_factory=lambda: int(os.getenv("TAIL_N", "0")))
-    timeout_sec: int = field(default_factory=lambda: int(os.getenv("OLLAMA_TIMEOUT", "120")))
-    window: int = field(default_factory=lambda: int(os.getenv("WINDOW", "800")))
-    allowlist: list[str] = field(default_factory=lambda: _split_allowlist(
-        os.getenv("ALLOWLIST", "systemctl status,systemctl restart,journalctl -u,grep,tail")
-    ))
-    keep_alive: str = field(default_factory=lambda: os.getenv("KEEP_ALIVE", "-1"))
-    fast_first: bool = field(default_factory=lambda: os.getenv("FAST_FIRST", "1").lower() not in ("0","false","no"))
-    skip_diagnostics: bool = field(default_factory=lambda: os.getenv("SKIP_DIAG", "0").lower() in ("1","true","yes"))
+    model: str = _MODEL
+    base_url: str = _BASE_URL
+    incident_dir: str = _INCIDENT_DIR
+    context_lines: int = _CONTEXT_LINES
+    tail_n: int = _TAIL_N
+    timeout_sec: int = _TIMEOUT_SEC
+    window: int = _WINDOW
+    allowlist: list[str] = field(default_factory=lambda: list(_ALLOWLIST))
+    keep_alive: str = _KEEP_ALIVE
+    fast_first: bool = _FAST_FIRST
+    skip_diagnostics: bool = _SKIP_DIAG
 
-    # --- NEW: auto-restart policy knobs ---
-    auto_policy: str = field(default_factory=lambda: os.getenv("AUTO_POLICY", "oai_only"))  # 'oai_only'|'whitelist'|'any'
-    whitelist_file: str = field(default_factory=lambda: os.getenv("WHITELIST_FILE", "/etc/oai-guard-whitelist.txt"))
-    auto_verify_timeout: int = field(default_factory=lambda: int(os.getenv("AUTO_VERIFY_TIMEOUT", "20")))
-    auto_verify_interval: int = field(default_factory=lambda: int(os.getenv("AUTO_VERIFY_INTERVAL", "2")))
+    # --- auto-restart policy knobs ---
+    auto_policy: str = _AUTO_POLICY
+    whitelist_file: str = _WHITELIST_FILE
+    auto_verify_timeout: int = _AUTO_VERIFY_TIMEOUT
+    auto_verify_interval: int = _AUTO_VERIFY_INTERVAL
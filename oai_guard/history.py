@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Signature-keyed triage history backed by SQLite.
+
+Recurring errors normalize (via parsing.make_signature) to the same key,
+so a plan computed once can be replayed without another model round trip.
+The module keeps one long-lived connection: pragmas and schema run once
+per process instead of per lookup.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+DB_PATH = os.environ.get("OAI_HISTORY_DB", "/var/log/oai_incidents/history.db")
+
+_CON: Optional[sqlite3.Connection] = None
+
+def _conn() -> sqlite3.Connection:
+    """Return the shared module-level connection, creating it (schema +
+    WAL pragmas) only on first use."""
+    global _CON
+    if _CON is None:
+        d = os.path.dirname(DB_PATH)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        con = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA temp_store=MEMORY")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "  sig     TEXT PRIMARY KEY,"
+            "  plan    TEXT NOT NULL,"
+            "  hits    INTEGER NOT NULL DEFAULT 1,"
+            "  updated INTEGER NOT NULL"
+            ")"
+        )
+        atexit.register(con.close)
+        _CON = con
+    return _CON
+
+def get(sig: str) -> Optional[Dict[str, Any]]:
+    row = _conn().execute("SELECT plan FROM history WHERE sig=?", (sig,)).fetchone()
+    if not row:
+        return None
+    try:
+        return json.loads(row[0])
+    except Exception:
+        return None
+
+@contextmanager
+def transaction():
+    """Group many put() calls into a single commit.
+
+    The connection runs in autocommit (isolation_level=None), so bulk
+    paths like `cli --once` would otherwise pay one fsync per triaged
+    event; inside this context they pay exactly one.
+    """
+    con = _conn()
+    con.execute("BEGIN")
+    try:
+        yield
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+def put(sig: str, plan: Dict[str, Any]) -> None:
+    _conn().execute(
+        "INSERT INTO history(sig, plan, hits, updated) VALUES(?,?,1,?) "
+        "ON CONFLICT(sig) DO UPDATE SET "
+        "  plan=excluded.plan, hits=hits+1, updated=excluded.updated",
+        (sig, json.dumps(plan), int(time.time())),
+    )
@@ -1,20 +1,36 @@
+import hashlib
 import re
 from typing import Optional, Dict, List
 
 # Coarse severity trigger
 LEVEL_RE = re.compile(r"\b(error|fatal|critical|panic|segfault)\b", re.I)
 
+# Bytes twin of LEVEL_RE for scanning mmap'd files without decoding them.
+LEVEL_RE_B = re.compile(rb"\b(?:error|fatal|critical|panic|segfault)\b", re.I)
+
+# Cheap substring pre-screen: only lines containing one of these words can
+# match LEVEL_RE, so callers in hot loops skip the regex for ~99% of lines.
+_LEVEL_WORDS = ("error", "fatal", "critical", "panic", "segfault")
+
+def looks_severe(line: str) -> bool:
+    low = line.lower()
+    return any(w in low for w in _LEVEL_WORDS) and LEVEL_RE.search(line) is not None
+
 # OAI-ish line pattern:
 # 2025-08-08 09:12:25.109 [SMF] ERROR    Message...
-LINE_RE = re.compile(r"""
-^(?P<ts>\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\.\d{3})\s+
-\[(?P<component>[A-Za-z0-9_-]+)\]\s+
-(?P<level>INFO|WARN|WARNING|ERROR|CRITICAL|FATAL)\s+
-(?P<message>.*)$
-""", re.X)
+LINE_RE = re.compile(
+    r"^(?P<ts>\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\.\d{3})\s+"
+    r"\[(?P<component>[A-Za-z0-9_-]+)\]\s+"
+    r"(?P<level>INFO|WARN|WARNING|ERROR|CRITICAL|FATAL)\s+"
+    r"(?P<message>.*)$"
+)
 
 def parse_line_to_kv(line: str) -> Dict:
-    m = LINE_RE.search(line)
+    # Fast reject before touching the regex: a matching line starts with a
+    # "YYYY-" timestamp and is at least as long as "ts [C] LEVEL ".
+    if len(line) < 23 or not line[:4].isdigit() or line[4] != "-":
+        return {"raw": line}
+    m = LINE_RE.match(line)
     if not m:
         return {"raw": line}
     level = m.group("level")
@@ -31,5 +47,54 @@ def parse_line_to_kv(line: str) -> Dict:
 def kvs_from_lines(lines: List[str]) -> List[Dict]:
     return [parse_line_to_kv(l) for l in lines]
 
+# Signature normalization: collapse volatile tokens (timestamps, addresses,
+# counters, quoted payloads) so recurring errors map to one stable key.
+# All token classes are fused into a single alternation so each line is
+# scanned once, with the replacement picked by the matched group name.
+_SIG_RE = re.compile(r"""
+(?P<ts>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?)
+|(?P<ip>\b\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}(?::\d+)?\b)
+|(?P<hex>0x[0-9A-Fa-f]+)
+|(?P<num>\b\d+\b)
+|(?P<sq>'[^']*')
+|(?P<dq>"[^"]*")
+""", re.X)
+
+_SIG_REPL = {
+    "ts": b"<TS>",
+    "ip": b"<IP>",
+    "hex": b"<HEX>",
+    "num": b"<N>",
+    "sq": b"<STR>",
+    "dq": b"<STR>",
+}
+
+def make_signature(line: str) -> str:
+    """Stable cache key for a log line, volatile tokens masked in one pass.
+
+    Literal and replacement chunks are streamed straight into a blake2b
+    hasher, so no normalized intermediate string is ever built.
+    """
+    line = line.strip()
+    h = hashlib.blake2b(digest_size=20)
+    last = 0
+    for m in _SIG_RE.finditer(line):
+        h.update(line[last:m.start()].encode())
+        h.update(_SIG_REPL[m.lastgroup])
+        last = m.end()
+    h.update(line[last:].encode())
+    return h.hexdigest()
+
+# Membership over the casings that actually occur (parse_line_to_kv emits
+# upper-case, JSON events are typically upper or lower) — avoids allocating
+# a new string via .upper() for every ingested line.
+_ERR_LEVELS = frozenset({
+    "ERROR", "CRITICAL", "FATAL",
+    "error", "critical", "fatal",
+    "Error", "Critical", "Fatal",
+})
+
 def is_error_level(level: Optional[str]) -> bool:
-    return (level or "").upper() in ("ERROR", "CRITICAL", "FATAL")
+    if not level:
+        return False
+    return level in _ERR_LEVELS or level.upper() in _ERR_LEVELS
@@ -1,40 +1,162 @@
+from array import array
+from bisect import bisect_right
 from collections import deque
-import subprocess
+import ctypes
+import mmap
+import os
+import re
+import select
+import time
 from typing import List, Optional, Tuple
-from .parsing import LEVEL_RE, parse_line_to_kv, is_error_level
+from .parsing import LEVEL_RE, LEVEL_RE_B, looks_severe, parse_line_to_kv, is_error_level
+
+_NL_RE = re.compile(rb"\n")
+
+# inotify event bits we care about (see <sys/inotify.h>)
+_IN_MODIFY      = 0x00000002
+_IN_ATTRIB      = 0x00000004
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF   = 0x00000800
+
+def _inotify_watch(path: str) -> Optional[int]:
+    """Add an inotify watch on `path`; return the inotify fd, or None
+    where inotify is unavailable (non-Linux) so callers can fall back
+    to sleep-polling."""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(0)
+        if fd < 0:
+            return None
+        mask = _IN_MODIFY | _IN_ATTRIB | _IN_DELETE_SELF | _IN_MOVE_SELF
+        if libc.inotify_add_watch(fd, path.encode(), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except Exception:
+        return None
 
 def follow_file(path: str, tail_n: int):
-    """Yield lines from `tail -F`. tail_n=0 => only new lines."""
-    proc = subprocess.Popen(["tail", "-n", str(tail_n), "-F", path],
-                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                            text=True, bufsize=1, universal_newlines=True)
+    """Yield appended lines natively. tail_n=0 => only new lines.
+
+    Replaces the old `tail -n .. -F` subprocess: the file is read directly
+    with seek + read (no fork, no pipe copy, no per-line text layer) and the
+    generator blocks on inotify between appends, falling back to a short
+    sleep poll where inotify is unavailable. Rotation/truncation is detected
+    by inode/size checks and the file is reopened, mirroring `tail -F`.
+    """
+    if tail_n > 0:
+        for line in tail_lines(path, tail_n):
+            yield line
+    f = open(path, "rb")
+    f.seek(0, os.SEEK_END)
+    ifd = _inotify_watch(path)
+    pending = bytearray()
     try:
-        for line in iter(proc.stdout.readline, ""):
-            yield line.rstrip("\n")
+        while True:
+            chunk = f.read(65536)
+            if chunk:
+                pending += chunk
+                while True:
+                    nl = pending.find(b"\n")
+                    if nl < 0:
+                        break
+                    yield pending[:nl].decode("utf-8", "replace")
+                    del pending[:nl + 1]
+                continue
+            # At EOF: check for rotation/truncation, then block for events.
+            rotated = False
+            try:
+                st = os.stat(path)
+                rotated = st.st_ino != os.fstat(f.fileno()).st_ino or st.st_size < f.tell()
+            except FileNotFoundError:
+                rotated = True
+            if rotated:
+                try:
+                    nf = open(path, "rb")
+                except FileNotFoundError:
+                    time.sleep(0.25)
+                    continue
+                f.close()
+                f = nf
+                if ifd is not None:
+                    os.close(ifd)
+                ifd = _inotify_watch(path)
+                continue
+            if ifd is not None:
+                r, _, _ = select.select([ifd], [], [], 1.0)
+                if r:
+                    os.read(ifd, 4096)  # drain; content is re-read above
+            else:
+                time.sleep(0.25)
     finally:
-        proc.kill()
+        f.close()
+        if ifd is not None:
+            os.close(ifd)
 
 def scan_file_once(path: str, max_context: int):
-    """Return list[(error_line, context_lines)] scanning entire file."""
-    buf = deque(maxlen=max_context)
+    """Return list[(error_line, context_lines, kv)] scanning entire file.
+
+    The file is mmap'd and the severity pattern runs over the raw bytes,
+    so non-matching text never becomes a Python string. Only the error
+    line and its context window are decoded, and each error line is
+    parsed exactly once with the kv riding along for downstream triage.
+    """
     events = []
-    with open(path, "r", errors="replace") as f:
-        for raw in f:
-            line = raw.rstrip("\n")
-            buf.append(line)
-            if LEVEL_RE.search(line):
-                events.append((line, list(buf)))
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return events
+        with mm:
+            # Newline offsets computed once (C-speed finditer); every
+            # event's line and context bounds are then O(log n) bisects
+            # into this array instead of per-event rfind walks.
+            nl = array("q", [-1])
+            nl.extend(m.start() for m in _NL_RE.finditer(mm))
+            if nl[-1] != len(mm) - 1:
+                nl.append(len(mm))  # file without trailing newline
+            last_li = -1
+            for m in LEVEL_RE_B.finditer(mm):
+                li = bisect_right(nl, m.start()) - 1
+                if li == last_li:
+                    continue  # second severity word on the same line
+                last_li = li
+                line_start, line_end = nl[li] + 1, nl[li + 1]
+                line = mm[line_start:line_end].decode("utf-8", "replace")
+                if max_context > 0:
+                    ctx_start = nl[max(0, li - (max_context - 1))] + 1
+                    ctx = mm[ctx_start:line_end].decode("utf-8", "replace").splitlines()
+                else:
+                    ctx = []
+                events.append((line, ctx, parse_line_to_kv(line)))
     return events
 
 def tail_lines(path: str, n: int) -> List[str]:
-    out = subprocess.check_output(["tail", "-n", str(n), path], text=True, errors="replace")
-    return out.splitlines()
+    """Last `n` lines of `path`, read by seeking backward from EOF in
+    64 KiB blocks until enough newlines are seen — no tail subprocess,
+    and only the tail slice of the file is ever decoded."""
+    if n <= 0:
+        return []
+    blocks = []
+    newlines = 0
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        while pos > 0 and newlines <= n:
+            step = min(65536, pos)
+            pos -= step
+            f.seek(pos)
+            blk = f.read(step)
+            newlines += blk.count(b"\n")
+            blocks.append(blk)
+    data = b"".join(reversed(blocks))
+    return data.decode("utf-8", "replace").splitlines()[-n:]
 
 def last_error_event(path: str, window: int, max_context: int) -> Optional[Tuple[str, list[str]]]:
     lines = tail_lines(path, window)
     last_idx = None
     for i, line in enumerate(lines):
-        if LEVEL_RE.search(line):
+        if looks_severe(line):
             last_idx = i
     if last_idx is None:
         return None
@@ -61,13 +183,16 @@ def lines_from_events(events) -> List[str]:
     return lines
 
 def last_error_event_from_json(events, max_context: int) -> Optional[Tuple[str, list[str]]]:
+    # Scan backward and stop at the first hit — the last error is usually
+    # near the end, so this is O(1) expected instead of a full pass.
     last_idx = None
-    for i, ev in enumerate(events):
-        if is_error_level(str(ev.get("level", ""))):
+    for i in range(len(events) - 1, -1, -1):
+        lvl = events[i].get("level")
+        if lvl and is_error_level(str(lvl)):
             last_idx = i
+            break
     if last_idx is None:
         return None
-    lines = lines_from_events(events)
     start = max(0, last_idx - max_context)
-    ctx = lines[start:last_idx+1]
+    ctx = lines_from_events(events[start:last_idx+1])
     return (ctx[-1], ctx)
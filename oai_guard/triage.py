@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, re, json, subprocess, time
+import asyncio
+import os, re, json, shlex, subprocess, time
+from collections import OrderedDict, deque
+from types import MappingProxyType
 from typing import List, Dict, Any, Optional, Tuple
 from .model import Config, post_chat
+from .parsing import make_signature
+from . import history
+
+try:
+    import orjson  # C-accelerated; optional, stdlib json fallback below
+except Exception:
+    orjson = None
 
 INCIDENT_DIR = os.environ.get("OAI_INCIDENT_DIR", "/var/log/oai_incidents")
 os.makedirs(INCIDENT_DIR, exist_ok=True)
 
 USE_HEUR_DEFAULT = os.environ.get("OAI_USE_HEUR", "1") != "0"
+USE_HISTORY_DEFAULT = os.environ.get("OAI_USE_HISTORY", "1") != "0"
+
+_PLAN_KEYS = ("summary", "causes", "diagnostics_cmds", "fix_cmds", "risk_level", "need_human_review")
 
 _JSON_SYSPROMPT = (
     "You are a telecom (4G/5G core) troubleshooting assistant. "
@@ -22,91 +35,195 @@ _JSON_SYSPROMPT = (
     "NO prose, NO markdown, ONLY JSON."
 )
 
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+def _find_json_object(text: str) -> Optional[str]:
+    """Slice out the first balanced {...} block, honoring strings/escapes.
+
+    One linear pass instead of the old r\"\\{[\\s\\S]*\\}\" search, whose
+    greedy any-char body could backtrack badly on large model replies.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
 def extract_json(text: str) -> Optional[Dict[str, Any]]:
     try:
-        return json.loads(text)
+        return _json_loads(text)
     except Exception:
         pass
-    m = re.search(r"\{[\s\S]*\}", text)
-    if m:
+    candidate = _find_json_object(text)
+    if candidate:
         try:
-            return json.loads(m.group(0))
+            return _json_loads(candidate)
         except Exception:
             return None
     return None
 
+def _write_incident(path: str, incident: Dict[str, Any]) -> None:
+    # Render to one bytes blob and issue a single write syscall, skipping
+    # the buffered-IO layer entirely.
+    if orjson is not None:
+        payload = orjson.dumps(incident, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(incident, indent=2).encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, payload)
+    finally:
+        os.close(fd)
+
 # ---------------- Heuristics (optional fast path) ----------------
-_HEUR = [
-    (re.compile(r"DNN .*not configured", re.I),
-     lambda line: {
-         "summary": "Requested DNN not configured in SMF",
-         "causes": ["UE requested unknown DNN/APN", "SMF config missing DNN"],
-         "diagnostics_cmds": [
-             "journalctl -u oai-smf -n 120",
-             "grep -n \"DNN\" /etc/oai/smf.conf"
-         ],
-         "fix_cmds": ["systemctl restart oai-smf"],
-         "risk_level": "medium",
-         "need_human_review": True,
-     }),
-    (re.compile(r"NRF registration failed.*503", re.I),
-     lambda line: {
-         "summary": "NRF unavailable (503) during registration",
-         "causes": ["NRF down", "Network partition"],
-         "diagnostics_cmds": [
-             "systemctl status oai-nrf",
-             "journalctl -u oai-nrf -n 200"
-         ],
-         "fix_cmds": ["systemctl restart oai-nrf"],
-         "risk_level": "medium",
-         "need_human_review": True,
-     }),
-    (re.compile(r"PFCP.*Association.*timed out", re.I),
-     lambda line: {
-         "summary": "PFCP association timeout to UPF",
-         "causes": ["UPF not reachable", "Firewall/port 8805 blocked"],
-         "diagnostics_cmds": [
-             "journalctl -u oai-upf -n 120",
-             "ss -lntup | grep 8805"
-         ],
-         "fix_cmds": ["systemctl restart oai-upf"],
-         "risk_level": "medium",
-         "need_human_review": True,
-     }),
-    (re.compile(r"T3560 expired", re.I),
-     lambda line: {
-         "summary": "UE auth timeout (T3560)",
-         "causes": ["HSS/AUSF delay", "UE unreachable"],
-         "diagnostics_cmds": [
-             "journalctl -u oai-ausf -n 120",
-             "journalctl -u oai-amf -n 120"
-         ],
-         "fix_cmds": ["systemctl restart oai-amf"],
-         "risk_level": "low",
-         "need_human_review": True,
-     }),
+# Rule patterns and their recipes. The patterns are fused below into a
+# single alternation so each error line is scanned once, with the matched
+# group name selecting the rule — instead of trying every pattern in turn.
+# (A multi-pattern engine like hyperscan/re2 would do the same with a real
+# DFA, but is not a dependency of this repo.)
+# Recipes never template on the matched line, so they live as module
+# constants and are returned as-is — no per-hit dict/list allocation.
+# MappingProxyType makes the shared templates read-only: a caller that
+# tried to mutate one would raise instead of silently corrupting every
+# later match (incident.update only reads from them).
+_REC_DNN = MappingProxyType({
+    "summary": "Requested DNN not configured in SMF",
+    "causes": ["UE requested unknown DNN/APN", "SMF config missing DNN"],
+    "diagnostics_cmds": [
+        "journalctl -u oai-smf -n 120",
+        "grep -n \"DNN\" /etc/oai/smf.conf"
+    ],
+    "fix_cmds": ["systemctl restart oai-smf"],
+    "risk_level": "medium",
+    "need_human_review": True,
+})
+_REC_NRF = MappingProxyType({
+    "summary": "NRF unavailable (503) during registration",
+    "causes": ["NRF down", "Network partition"],
+    "diagnostics_cmds": [
+        "systemctl status oai-nrf",
+        "journalctl -u oai-nrf -n 200"
+    ],
+    "fix_cmds": ["systemctl restart oai-nrf"],
+    "risk_level": "medium",
+    "need_human_review": True,
+})
+_REC_PFCP = MappingProxyType({
+    "summary": "PFCP association timeout to UPF",
+    "causes": ["UPF not reachable", "Firewall/port 8805 blocked"],
+    "diagnostics_cmds": [
+        "journalctl -u oai-upf -n 120",
+        "ss -lntup | grep 8805"
+    ],
+    "fix_cmds": ["systemctl restart oai-upf"],
+    "risk_level": "medium",
+    "need_human_review": True,
+})
+_REC_T3560 = MappingProxyType({
+    "summary": "UE auth timeout (T3560)",
+    "causes": ["HSS/AUSF delay", "UE unreachable"],
+    "diagnostics_cmds": [
+        "journalctl -u oai-ausf -n 120",
+        "journalctl -u oai-amf -n 120"
+    ],
+    "fix_cmds": ["systemctl restart oai-amf"],
+    "risk_level": "low",
+    "need_human_review": True,
+})
+
+_HEUR_RULES = [
+    (r"dnn .*not configured", _REC_DNN),
+    (r"nrf registration failed.*503", _REC_NRF),
+    (r"pfcp.*association.*timed out", _REC_PFCP),
+    (r"t3560 expired", _REC_T3560),
 ]
 
+# Structure-of-arrays split: pattern sources feed the fused regex, the
+# recipes sit in a parallel list indexed by rule id from the group name.
+_HEUR_SRC = [src for src, _ in _HEUR_RULES]
+_HEUR_RECIPES = [rec for _, rec in _HEUR_RULES]
+
+# One fused pattern; m.lastgroup "r<i>" gives the rule index. Sources
+# are written lowercase and matched against the line already lowercased
+# for the literal prefilter, so re.I case folding is never paid.
+_HEUR_RE = re.compile(
+    "|".join(f"(?P<r{i}>{src})" for i, src in enumerate(_HEUR_SRC))
+)
+
+# Distinctive literal per rule: a line matching any rule must contain one
+# of these, so C-speed substring tests reject non-matching lines before
+# the backtracking regex engine is entered at all.
+_HEUR_LITS = ("dnn", "nrf registration failed", "pfcp", "t3560")
+
 # ---------------- Safe exec policy ----------------
 _SAFE_SVC = re.compile(
     r"^(oai|open5gs)-(amf|smf|upf|ausf|nrf|pcf|udm|udr|bsf)d?$|^demo-svc$",
     re.I
 )
 
+# allow: status | restart | start
+_SYSCTL_CMD = re.compile(r"^systemctl\s+(status|restart|start)\s+([a-zA-Z0-9\-_.]+)$")
+
 def _run_safe(cmd: str, timeout: int = 20) -> Dict[str, Any]:
     cmd = cmd.strip()
-    # now allow: status | restart | start
-    m = re.match(r"^systemctl\s+(status|restart|start)\s+([a-zA-Z0-9\-_.]+)$", cmd)
+    m = _SYSCTL_CMD.match(cmd)
     if not m or not _SAFE_SVC.match(m.group(2)):
         return {"cmd": cmd, "skipped": True, "reason": "blocked by policy"}
     try:
-        out = subprocess.check_output(cmd.split(), stderr=subprocess.STDOUT, timeout=timeout).decode("utf-8", "ignore")
-        return {"cmd": cmd, "skipped": False, "rc": 0, "out": out[:4000]}
-    except subprocess.CalledProcessError as e:
-        return {"cmd": cmd, "skipped": False, "rc": e.returncode, "out": (e.output or b'').decode('utf-8','ignore')[:4000]}
+        # shlex honors quoted args that a naive .split() would break, and
+        # run() without check avoids the CalledProcessError raise/except
+        # round trip for non-zero exits.
+        r = subprocess.run(shlex.split(cmd), capture_output=True, timeout=timeout)
+        out = (r.stdout + r.stderr).decode("utf-8", "ignore")
+        return {"cmd": cmd, "skipped": False, "rc": r.returncode, "out": out[:4000]}
     except Exception as e:
         return {"cmd": cmd, "skipped": False, "rc": -1, "out": str(e)}
 
+async def _run_safe_async(cmd: str, timeout: int = 20) -> Dict[str, Any]:
+    """Async twin of _run_safe; same policy, same result shape."""
+    cmd = cmd.strip()
+    m = _SYSCTL_CMD.match(cmd)
+    if not m or not _SAFE_SVC.match(m.group(2)):
+        return {"cmd": cmd, "skipped": True, "reason": "blocked by policy"}
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd.split(),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return {"cmd": cmd, "skipped": False, "rc": -1, "out": f"timeout after {timeout}s"}
+        return {"cmd": cmd, "skipped": False, "rc": proc.returncode,
+                "out": out.decode("utf-8", "ignore")[:4000]}
+    except Exception as e:
+        return {"cmd": cmd, "skipped": False, "rc": -1, "out": str(e)}
+
+async def _run_safe_batch(cmds: List[str]) -> List[Dict[str, Any]]:
+    return list(await asyncio.gather(*(_run_safe_async(c) for c in cmds)))
+
 
 # ---------------- Baseline fallback (no model JSON) ----------------
 _COMP2SVC = {
@@ -123,12 +240,22 @@ _COMP2SVC = {
 }
 
 def _guess_component(error_line: str) -> str:
-    m = re.search(r"\[([A-Z]{2,4})\]", error_line)
-    return (m.group(1) if m else "").upper()
+    # Equivalent to searching r"\[([A-Z]{2,4})\]" but with two str.find
+    # calls and a case test — no regex engine setup for a trivial tag.
+    # Walk bracket pairs so a leading non-tag bracket doesn't hide the tag.
+    i = error_line.find("[")
+    while i >= 0:
+        j = error_line.find("]", i + 1)
+        if j < 0:
+            return ""
+        if 2 <= j - i - 1 <= 4:
+            tag = error_line[i + 1:j]
+            if tag.isupper() and tag.isalpha():
+                return tag
+        i = error_line.find("[", i + 1)
+    return ""
 
-def _baseline_plan(error_line: str) -> Dict[str, Any]:
-    comp = _guess_component(error_line)
-    services = _COMP2SVC.get(comp, [])
+def _build_comp_plan(comp: str, services: List[str]) -> Dict[str, Any]:
     # choose first service for restart; list both in diagnostics
     primary = services[0] if services else "oai-smf"
     diags = []
@@ -147,20 +274,88 @@ def _baseline_plan(error_line: str) -> Dict[str, Any]:
         "need_human_review": True,
     }
 
+# All known components get their plan fully baked at import — the request
+# path is a dict lookup plus a shallow copy, no f-string formatting.
+_COMP_PLANS = {comp: _build_comp_plan(comp, svcs) for comp, svcs in _COMP2SVC.items()}
+_COMP_PLANS[""] = _build_comp_plan("", [])
+
+def _baseline_plan(error_line: str, component: str = "") -> Dict[str, Any]:
+    comp = component or _guess_component(error_line)
+    plan = _COMP_PLANS.get(comp)
+    if plan is None:  # unknown tag: build once-off, keep the comp in the summary
+        plan = _build_comp_plan(comp, [])
+    # shallow copy so callers can't mutate the baked template
+    return dict(plan)
+
 def _heuristic_triage(error_line: str) -> Optional[Dict[str, Any]]:
-    for pat, rec in _HEUR:
-        if pat.search(error_line):
-            return rec(error_line)
-    return None
+    low = error_line.lower()
+    if not any(lit in low for lit in _HEUR_LITS):
+        return None
+    m = _HEUR_RE.search(low)
+    if not m:
+        return None
+    return _HEUR_RECIPES[int(m.lastgroup[1:])]
+
+# ---------------- Rolling context for streaming callers ----------------
+class CtxBuffer:
+    """Rolling tail of context lines with a cached joined form.
+
+    Streaming callers append one line per event; the joined text is only
+    rebuilt after an append actually happened, so repeated handle_error
+    calls over a mostly-unchanged tail stop paying the O(maxlen) join.
+    handle_error accepts either a plain list or one of these.
+    """
+    __slots__ = ("_dq", "_text")
 
-def handle_error(error_line: str, ctx_lines: List[str], cfg: Config, auto: bool = False, use_heuristics: bool = USE_HEUR_DEFAULT) -> Dict[str, Any]:
+    def __init__(self, maxlen: int = 32):
+        self._dq: deque = deque(maxlen=maxlen)
+        self._text: Optional[str] = None
+
+    def append(self, line: str) -> None:
+        self._dq.append(line)
+        self._text = None
+
+    def lines(self) -> List[str]:
+        return list(self._dq)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "\n".join(self._dq)
+        return self._text
+
+# ---------------- In-process plan cache ----------------
+# Keyed by (signature, engine, model, heuristics-flag): recurring alerts —
+# the common shape of a log stream — skip heuristics, history I/O, and the
+# model round trip entirely. Baseline fallbacks are never cached so a
+# later recurrence still gets a real model attempt.
+_PLAN_LRU: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_PLAN_LRU_MAX = 1024
+
+def _plan_cache_get(key) -> Optional[Dict[str, Any]]:
+    plan = _PLAN_LRU.get(key)
+    if plan is not None:
+        _PLAN_LRU.move_to_end(key)
+    return plan
+
+def _plan_cache_put(key, plan: Dict[str, Any]) -> None:
+    _PLAN_LRU[key] = plan
+    _PLAN_LRU.move_to_end(key)
+    if len(_PLAN_LRU) > _PLAN_LRU_MAX:
+        _PLAN_LRU.popitem(last=False)
+
+def handle_error(error_line: str, ctx_lines: "List[str] | CtxBuffer", cfg: Config, auto: bool = False, use_heuristics: bool = USE_HEUR_DEFAULT, use_history: bool = USE_HISTORY_DEFAULT, kv: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     ts = time.strftime("%Y%m%d-%H%M%S", time.localtime())
+    sig = make_signature(error_line)
     incident = {
         "timestamp": ts,
         "engine": cfg.engine,
         "model": cfg.openai_model if cfg.engine == "openai" else cfg.ollama_model,
         "error_line": error_line,
-        "context_tail": ctx_lines[-32:],
+        "signature": sig,
+        "from_history": False,
+        "from_cache": False,
+        "context_tail": ctx_lines.lines() if isinstance(ctx_lines, CtxBuffer) else ctx_lines[-32:],
         "summary": "",
         "causes": [],
         "diagnostics_cmds": [],
@@ -173,14 +368,31 @@ def handle_error(error_line: str, ctx_lines: List[str], cfg: Config, auto: bool
         "retry_raw": "",
     }
 
-    heur = _heuristic_triage(error_line) if use_heuristics else None
+    cache_key = (sig, cfg.engine, incident["model"], use_heuristics)
+    cached = _plan_cache_get(cache_key)
+    heur = _heuristic_triage(error_line) if use_heuristics and cached is None else None
     used_baseline = False
 
-    if heur:
+    if cached is not None:
+        for k in _PLAN_KEYS:
+            if k in cached:
+                incident[k] = cached[k]
+        incident["from_cache"] = True
+    elif heur:
         incident.update(heur)
+    elif use_history and (hist := history.get(sig)) is not None:
+        # Seen this signature before: replay the stored plan, no model call.
+        for k in _PLAN_KEYS:
+            if k in hist:
+                incident[k] = hist[k]
+        incident["from_history"] = True
     else:
-        # 1st: model JSON
-        ctx = "\n".join(ctx_lines[-32:])
+        # 1st: model JSON (prompt text is only built on this branch — the
+        # cache/heuristic/history paths above never pay for the join)
+        if isinstance(ctx_lines, CtxBuffer):
+            ctx = ctx_lines.text  # cached join, reused across events
+        else:
+            ctx = "\n".join(incident["context_tail"])
         sys = _JSON_SYSPROMPT
         usr = f"ERROR:\n{error_line}\n\nCONTEXT (tail):\n{ctx}\n\nReturn ONLY JSON."
         raw = post_chat(
@@ -203,22 +415,27 @@ def handle_error(error_line: str, ctx_lines: List[str], cfg: Config, auto: bool
 
         # 3rd: baseline fallback (always produce something)
         if data:
-            for k in ("summary", "causes", "diagnostics_cmds", "fix_cmds", "risk_level", "need_human_review"):
+            for k in _PLAN_KEYS:
                 if k in data:
                     incident[k] = data[k]
+            if use_history:
+                history.put(sig, {k: incident[k] for k in _PLAN_KEYS})
         else:
-            incident.update(_baseline_plan(error_line))
+            # kv from the scan pass (if any) already carries the component,
+            # so the baseline plan can skip its regex guess.
+            incident.update(_baseline_plan(error_line, (kv or {}).get("component", "")))
             used_baseline = True
 
+    if cached is None and not used_baseline:
+        _plan_cache_put(cache_key, {k: incident[k] for k in _PLAN_KEYS})
+
     if auto and incident.get("fix_cmds"):
-        results = []
-        for cmd in incident["fix_cmds"]:
-            results.append(_run_safe(cmd))
-        incident["results"] = results
+        # Independent fixes run concurrently: total wall time is the
+        # slowest command, not the sum.
+        incident["results"] = asyncio.run(_run_safe_batch(incident["fix_cmds"]))
         incident["auto_ran"] = True
 
     path = os.path.join(INCIDENT_DIR, f"incident_{ts}.json")
-    with open(path, "w") as f:
-        json.dump(incident, f, indent=2)
+    _write_incident(path, incident)
     print(f"[+] Incident saved: {path}" + (" (baseline)" if used_baseline else ""))
     return incident
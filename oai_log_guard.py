@@ -17,9 +17,20 @@ Usage examples:
 """
 
 import os, re, sys, json, time, shlex, argparse, subprocess
+import ctypes, hashlib, mmap, queue, select, threading
+from array import array
+from bisect import bisect_right
 from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+    _loads = orjson.loads   # C-accelerated; ~3-5x faster on small chunks
+except Exception:
+    orjson = None
+    _loads = json.loads
 
 # ======== CONFIG (env-overridable) ========
 MODEL        = os.getenv("OLLAMA_MODEL", "llama3.2")
@@ -41,6 +52,17 @@ ALLOWLIST = [
 # Trigger on these severities (tune if you want tighter)
 LEVEL_RE = re.compile(r"\b(error|fatal|critical|panic|segfault)\b", re.I)
 
+# Cheap substring pre-screen: only lines containing one of these words
+# can match LEVEL_RE, so the hot loops reject ~99% of lines with C-speed
+# `in` tests before the regex engine is ever entered. (An Aho-Corasick
+# automaton would fuse the five scans into one, but pyahocorasick is not
+# a dependency here and five literals are cheap.)
+_LEVEL_WORDS = ("error", "fatal", "critical", "panic", "segfault")
+
+def looks_severe(line: str) -> bool:
+    low = line.lower()
+    return any(w in low for w in _LEVEL_WORDS) and LEVEL_RE.search(line) is not None
+
 SYSTEM_PROMPT = f"""
 You are a senior SRE for OpenAirInterface (OAI) core (AMF/SMF/UPF/NRF/NGAP/NAS/RRC/PFCP).
 Given recent log context and a specific error line, return STRICT JSON ONLY with keys:
@@ -53,6 +75,12 @@ Given recent log context and a specific error line, return STRICT JSON ONLY with
 Rules: output JSON only (no prose/markdown). Prefer reversible fixes. If unsure, set need_human_review=true.
 """.strip()
 
+# One pooled session: urllib3 keep-alive reuses the socket across calls
+# instead of paying socket()+connect() (and TLS, for remote hosts) each time.
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+
 # ======== Helpers ========
 def ensure_dirs():
     os.makedirs(INCIDENT_DIR, exist_ok=True)
@@ -61,28 +89,31 @@ def ts():
     return time.strftime("%Y%m%d-%H%M%S")
 
 def _gen_prompt(messages):
-    """Flatten chat messages to a single prompt for /api/generate."""
-    sys_txt = []
+    """Flatten chat messages to a single prompt for /api/generate.
+
+    Assembled as one list + a single join — no incremental `+=` string
+    copies; str.join does the whole concatenation in C.
+    """
+    parts = []
     user_txt = []
     for m in messages:
         role = m.get("role", "user")
         content = m.get("content", "")
         if role == "system":
-            sys_txt.append(content)
+            parts.append(content)
         else:
             user_txt.append(f"{role.upper()}:\n{content}")
-    out = ""
-    if sys_txt:
-        out += "\n".join(sys_txt).strip() + "\n\n"
-    out += "You must reply with STRICT JSON only.\n\n" + "\n\n".join(user_txt).strip()
-    return out
+    head = "\n".join(parts).strip()
+    body = "\n\n".join(user_txt).strip()
+    if head:
+        return f"{head}\n\nYou must reply with STRICT JSON only.\n\n{body}"
+    return f"You must reply with STRICT JSON only.\n\n{body}"
 
 def post_chat(messages, timeout=TIMEOUT_SEC):
     """
     Use /api/generate with streaming to avoid long blocking reads.
     Accumulates 'response' chunks and returns the concatenated string.
     """
-    import json as _json
     payload = {
         "model": MODEL,
         "prompt": _gen_prompt(messages),
@@ -91,7 +122,7 @@ def post_chat(messages, timeout=TIMEOUT_SEC):
         "options": {"num_predict": 256, "temperature": 0.2},
         "keep_alive": "5m",
     }
-    with requests.post(f"{BASE_URL}/api/generate", json=payload,
+    with _SESSION.post(f"{BASE_URL}/api/generate", json=payload,
                        stream=True, timeout=(10, max(timeout, 600))) as r:
         r.raise_for_status()
         chunks = []
@@ -99,7 +130,8 @@ def post_chat(messages, timeout=TIMEOUT_SEC):
             if not line:
                 continue
             try:
-                chunk = _json.loads(line.decode("utf-8"))
+                # orjson parses the raw bytes directly; no per-chunk decode.
+                chunk = _loads(line)
             except Exception:
                 continue
             if "response" in chunk:
@@ -108,69 +140,270 @@ def post_chat(messages, timeout=TIMEOUT_SEC):
                 break
     return "".join(chunks)
 
+# Compiled once; fence stripping is only needed when the reply actually
+# starts with a fence, so the common bare-JSON case skips regex entirely.
+FENCE_RE = re.compile(r"^```json\s*|\s*```$", re.I | re.M)
+
+# raw_decode parses from a start offset and ignores trailing junk, so
+# one C-side pass replaces the old find/rfind slice + reparse.
+_DEC = json.JSONDecoder()
+
 def extract_json(s: str):
-    """Be forgiving: strip code fences and grab the largest {...} block."""
+    """Be forgiving: strip code fences and parse the first {...} object."""
     s = s.strip()
-    s = re.sub(r"^```json\s*|\s*```$", "", s, flags=re.I | re.M)
-    first = s.find("{")
-    last  = s.rfind("}")
-    if first != -1 and last != -1 and last > first:
-        candidate = s[first:last+1]
-        return json.loads(candidate)
-    # final attempt
+    if s.startswith("```"):
+        s = FENCE_RE.sub("", s)
+    i = s.find("{")
+    if i >= 0:
+        obj, _ = _DEC.raw_decode(s, i)
+        return obj
+    # final attempt (raises on garbage, as before)
     return json.loads(s)
 
 def allowed(cmd: str) -> bool:
     cmd = cmd.strip()
     return any(cmd.startswith(prefix) for prefix in ALLOWLIST)
 
+# argv templates pre-split per allowlist prefix (longest first so nested
+# prefixes resolve correctly): run_cmd then shlex-parses only the short
+# suffix — usually a single unit name — instead of the whole string.
+_ALLOW_TEMPLATES = sorted(
+    ((p, p.split()) for p in ALLOWLIST), key=lambda t: -len(t[0])
+)
+
 def run_cmd(cmd: str):
     try:
-        parts = shlex.split(cmd)
+        cmd_s = cmd.strip()
+        for prefix, template in _ALLOW_TEMPLATES:
+            rest = cmd_s[len(prefix):]
+            if cmd_s.startswith(prefix) and (not rest or rest[0] in " \t"):
+                parts = template + shlex.split(rest)
+                break
+        else:
+            parts = shlex.split(cmd_s)
         p = subprocess.run(parts, capture_output=True, text=True, timeout=180)
         return {"cmd": cmd, "rc": p.returncode, "stdout": p.stdout[-4000:], "stderr": p.stderr[-4000:]}
     except Exception as e:
         return {"cmd": cmd, "rc": -1, "stdout": "", "stderr": str(e)}
 
+# inotify event bits we care about (see <sys/inotify.h>)
+_IN_MODIFY      = 0x00000002
+_IN_ATTRIB      = 0x00000004
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF   = 0x00000800
+
+def _inotify_watch(path: str):
+    """Add an inotify watch on `path`; return the inotify fd, or None
+    where inotify is unavailable (non-Linux) so the follower falls back
+    to sleep-polling."""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(0)
+        if fd < 0:
+            return None
+        mask = _IN_MODIFY | _IN_ATTRIB | _IN_DELETE_SELF | _IN_MOVE_SELF
+        if libc.inotify_add_watch(fd, path.encode(), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except Exception:
+        return None
+
 def follow_file(path: str):
-    """Live mode: follow new lines only (TAIL_N controls backlog)."""
-    proc = subprocess.Popen(["tail", "-n", str(TAIL_N), "-F", path],
-                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                            text=True, bufsize=1, universal_newlines=True)
+    """Live mode: follow new lines only (TAIL_N controls backlog).
+
+    Reads the file directly with seek + bulk read instead of spawning
+    `tail -F` — no fork, no pipe copy, no per-line text decode — and
+    blocks on inotify between appends (short sleep poll where inotify
+    is unavailable). Rotation/truncation is detected via inode/size
+    checks and the file reopened, mirroring `tail -F`.
+    """
+    if TAIL_N > 0:
+        for line in tail_lines(path, TAIL_N):
+            yield line
+    f = open(path, "rb")
+    f.seek(0, os.SEEK_END)
+    ifd = _inotify_watch(path)
+    pending = bytearray()
     try:
-        for line in iter(proc.stdout.readline, ""):
-            yield line.rstrip("\n")
+        while True:
+            chunk = f.read(65536)
+            if chunk:
+                pending += chunk
+                while True:
+                    nl = pending.find(b"\n")
+                    if nl < 0:
+                        break
+                    yield pending[:nl].decode("utf-8", "replace")
+                    del pending[:nl + 1]
+                continue
+            # At EOF: check for rotation/truncation, then block for events.
+            rotated = False
+            try:
+                st = os.stat(path)
+                rotated = st.st_ino != os.fstat(f.fileno()).st_ino or st.st_size < f.tell()
+            except FileNotFoundError:
+                rotated = True
+            if rotated:
+                try:
+                    nf = open(path, "rb")
+                except FileNotFoundError:
+                    time.sleep(0.25)
+                    continue
+                f.close()
+                f = nf
+                if ifd is not None:
+                    os.close(ifd)
+                ifd = _inotify_watch(path)
+                continue
+            if ifd is not None:
+                r, _, _ = select.select([ifd], [], [], 1.0)
+                if r:
+                    os.read(ifd, 4096)  # drain; content is re-read above
+            else:
+                time.sleep(0.25)
     finally:
-        proc.kill()
+        f.close()
+        if ifd is not None:
+            os.close(ifd)
+
+# Bytes twin of LEVEL_RE so the whole-file scan never decodes non-matches.
+LEVEL_RE_B = re.compile(rb"\b(?:error|fatal|critical|panic|segfault)\b", re.I)
+_NL_RE = re.compile(rb"\n")
 
 def scan_file_once(path: str, max_context: int = MAX_CONTEXT):
-    """One-shot: iterate entire file collecting error lines + context."""
-    buf = deque(maxlen=max_context)
+    """One-shot: collect error lines + context from an mmap'd buffer.
+
+    The severity pattern runs once over the entire mapped file — one
+    block scan instead of a per-line search call — and only event lines
+    plus their context windows are ever decoded into Python strings.
+    (Hyperscan would JIT this further but is not a dependency; a bytes
+    regex over mmap keeps the same one-pass structure.)
+
+    Duplicate events (same context bytes, e.g. a stack repeated many
+    times) are dropped here, by digesting the raw mmap slice *before*
+    decoding — repeats never materialize their context strings at all.
+    """
     events = []
-    with open(path, "r", errors="replace") as f:
-        for raw in f:
-            line = raw.rstrip("\n")
-            buf.append(line)
-            if LEVEL_RE.search(line):
-                events.append((line, list(buf)))
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return events
+        with mm:
+            # Newline offsets indexed once (C-speed finditer); each hit's
+            # line and context bounds are then O(log n) bisects into the
+            # table instead of per-event backward rfind walks. (numpy's
+            # flatnonzero would vectorize this further but isn't a
+            # dependency; array + finditer stays pure-stdlib.)
+            nl = array("q", [-1])
+            nl.extend(m.start() for m in _NL_RE.finditer(mm))
+            if nl[-1] != len(mm) - 1:
+                nl.append(len(mm))  # file without trailing newline
+            last_li = -1
+            seen = set()
+            for m in LEVEL_RE_B.finditer(mm):
+                li = bisect_right(nl, m.start()) - 1
+                if li == last_li:
+                    continue  # second severity word on the same line
+                last_li = li
+                line_start, line_end = nl[li] + 1, nl[li + 1]
+                ctx_start = nl[max(0, li - (max_context - 1))] + 1
+                key = hashlib.blake2b(mm[ctx_start:line_end], digest_size=16).digest()
+                if key in seen:
+                    continue
+                seen.add(key)
+                line = mm[line_start:line_end].decode("utf-8", "replace")
+                ctx = mm[ctx_start:line_end].decode("utf-8", "replace").splitlines()
+                events.append((line, ctx))
     return events
 
 def tail_lines(path: str, n: int):
-    out = subprocess.check_output(["tail", "-n", str(n), path], text=True, errors="replace")
-    return out.splitlines()
+    """Last `n` lines of `path`, read by seeking backward from EOF in
+    64 KiB blocks until enough newlines are seen — no tail subprocess,
+    and only the tail slice of the file is ever decoded."""
+    if n <= 0:
+        return []
+    blocks = []
+    newlines = 0
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        while pos > 0 and newlines <= n:
+            step = min(65536, pos)
+            pos -= step
+            f.seek(pos)
+            blk = f.read(step)
+            newlines += blk.count(b"\n")
+            blocks.append(blk)
+    data = b"".join(reversed(blocks))
+    return data.decode("utf-8", "replace").splitlines()[-n:]
 
 def last_error_event(path: str, window: int = LAST_WINDOW, max_context: int = MAX_CONTEXT):
-    """Return (last_error_line, context_lines) from the last `window` lines."""
+    """Return (last_error_line, context_lines) from the last `window` lines.
+
+    Walks the tail backward and stops at the first severe line — the
+    last error is usually near the end, so most of the window is never
+    even looked at.
+    """
     lines = tail_lines(path, window)
-    last_idx = None
-    for i, line in enumerate(lines):
-        if LEVEL_RE.search(line):
-            last_idx = i
-    if last_idx is None:
+    for i in range(len(lines) - 1, -1, -1):
+        if looks_severe(lines[i]):
+            start = max(0, i - max_context)
+            return (lines[i], lines[start:i + 1])
+    return None
+
+# On-disk response cache: logs repeat the same error many times and each
+# repeat would cost a full 256-token generation. One file per key under
+# INCIDENT_DIR/.cache, expired by mtime. blake2b is the cheapest stdlib
+# digest and plenty for cache keying.
+CACHE_DIR = os.path.join(INCIDENT_DIR, ".cache")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "86400"))  # seconds; 0 disables
+
+def _cache_key(error_line: str, context: str) -> str:
+    return hashlib.blake2b(f"{MODEL}\n{error_line}\n{context}".encode(), digest_size=16).hexdigest()
+
+def _cache_get(key: str):
+    if CACHE_TTL <= 0:
+        return None
+    path = os.path.join(CACHE_DIR, key)
+    try:
+        if time.time() - os.stat(path).st_mtime > CACHE_TTL:
+            return None
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
         return None
-    start = max(0, last_idx - max_context)
-    ctx = lines[start:last_idx + 1]
-    return (lines[last_idx], ctx)
+
+def _cache_put(key: str, raw: str):
+    if CACHE_TTL <= 0:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        path = os.path.join(CACHE_DIR, key)
+        with open(path + ".tmp", "w") as f:
+            f.write(raw)
+        os.replace(path + ".tmp", path)  # atomic: readers never see partials
+    except OSError:
+        pass
+
+# The model occasionally returns well-formed JSON with the wrong shape
+# (a bare string, fix_cmds as one string, a nonsense risk level). Check
+# the handful of fields we actually read before acting on a reply, so a
+# malformed one hits the retry path instead of yielding a half-empty
+# incident record.
+_LIST_FIELDS = ("probable_causes", "diagnostics_cmds", "fix_cmds")
+
+def _valid_triage(data) -> bool:
+    if not isinstance(data, dict):
+        return False
+    if not isinstance(data.get("incident_summary", ""), str):
+        return False
+    for k in _LIST_FIELDS:
+        v = data.get(k, [])
+        if not (isinstance(v, list) and all(isinstance(c, str) for c in v)):
+            return False
+    return str(data.get("risk_level", "low")).lower() in ("low", "medium", "high")
 
 def handle_error(error_line: str, ctx_lines, auto: bool = False):
     context = "\n".join(ctx_lines)
@@ -180,17 +413,34 @@ def handle_error(error_line: str, ctx_lines, auto: bool = False):
          "content": f"Recent log context (latest at end):\n```\n{context}\n```\n\nError line:\n```\n{error_line}\n```"}
     ]
 
-    raw = post_chat(base_msgs)
-    try:
-        data = extract_json(raw)
-    except Exception:
-        # Retry once with explicit instruction
-        retry_msgs = base_msgs + [
-            {"role": "user",
-             "content": "Previous reply was invalid JSON. Respond again with a SINGLE, COMPLETE, STRICT JSON object only."}
-        ]
-        raw = post_chat(retry_msgs)
-        data = extract_json(raw)  # if this fails, let it raise
+    key = _cache_key(error_line, context)
+    data = None
+    raw = _cache_get(key)
+    if raw is not None:
+        try:
+            data = extract_json(raw)
+            if not _valid_triage(data):
+                data = None
+        except Exception:
+            data = None  # corrupt/stale entry: fall through to a real call
+
+    if data is None:
+        raw = post_chat(base_msgs)
+        try:
+            data = extract_json(raw)
+            if not _valid_triage(data):
+                raise ValueError("triage JSON failed shape validation")
+        except Exception:
+            # Retry once with explicit instruction
+            retry_msgs = base_msgs + [
+                {"role": "user",
+                 "content": "Previous reply was invalid JSON. Respond again with a SINGLE, COMPLETE, STRICT JSON object only."}
+            ]
+            raw = post_chat(retry_msgs)
+            data = extract_json(raw)  # if this fails, let it raise
+            if not _valid_triage(data):
+                raise ValueError(f"model returned invalid triage JSON: {raw[:200]!r}")
+        _cache_put(key, raw)
 
     record = {
         "timestamp": ts(),
@@ -205,9 +455,11 @@ def handle_error(error_line: str, ctx_lines, auto: bool = False):
         "results": []
     }
 
-    # Run diagnostics (allowed-only)
-    for cmd in record["diagnostics_cmds"]:
-        record["results"].append(run_cmd(cmd))
+    # Run diagnostics (allowed-only) concurrently — each is a separate
+    # process anyway, so the waits overlap; map keeps result order.
+    if record["diagnostics_cmds"]:
+        with ThreadPoolExecutor(max_workers=4) as ex:
+            record["results"].extend(ex.map(run_cmd, record["diagnostics_cmds"]))
 
     # Auto remediation (very conservative)
     if auto and not record["need_human_review"] and record["risk_level"] == "low":
@@ -217,8 +469,16 @@ def handle_error(error_line: str, ctx_lines, auto: bool = False):
 
     ensure_dirs()
     fname = os.path.join(INCIDENT_DIR, f"incident_{record['timestamp']}.json")
-    with open(fname, "w") as f:
-        json.dump(record, f, indent=2)
+    if orjson is not None:
+        payload = orjson.dumps(record, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(record, indent=2).encode("utf-8")
+    # one pre-rendered blob, one write syscall
+    fd = os.open(fname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, payload)
+    finally:
+        os.close(fd)
     print(f"[+] Incident saved: {fname}")
 
 # ======== Main ========
@@ -228,7 +488,7 @@ def main():
     ap.add_argument("--auto", action="store_true", help="Auto-run safe fixes when risk=low & no human review needed.")
     ap.add_argument("--once", action="store_true", help="Scan whole file once (collect all errors) then exit.")
     ap.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "2")),
-                    help="Concurrency for --once (default 2).")
+                    help="Concurrency for --once and live handling (default 2).")
     ap.add_argument("--last", action="store_true", help="Process only the most recent error in the last WINDOW lines, then exit.")
     ap.add_argument("--window", type=int, default=LAST_WINDOW, help="Lines to scan from tail when using --last.")
     args = ap.parse_args()
@@ -244,8 +504,10 @@ def main():
         return
 
     if args.once:
+        # scan_file_once coalesces repeats on the raw bytes, so each
+        # surviving event is unique and costs exactly one generation.
         events = scan_file_once(args.log_path)
-        print(f"[+] Found {len(events)} error events")
+        print(f"[+] Found {len(events)} unique error events")
         if not events:
             return
         with ThreadPoolExecutor(max_workers=args.workers) as ex:
@@ -254,17 +516,42 @@ def main():
                 fut.result()
         return
 
-    # Live tail
+    # Live tail. Ingestion and handling are decoupled: the tail loop only
+    # classifies lines and enqueues (error, context) snapshots; daemon
+    # workers drain the queue and do the LLM round-trips. An error burst
+    # therefore no longer stalls the follower for seconds per event, and
+    # the bounded queue caps memory if the model falls behind.
     print(f"[+] Monitoring {args.log_path} | model={MODEL} | auto={args.auto}")
+    events: "queue.Queue" = queue.Queue(maxsize=128)
+
+    def _handler_worker():
+        while True:
+            err, ctx = events.get()
+            try:
+                handle_error(err, ctx, auto=args.auto)
+            except Exception as e:
+                print(f"[x] Handler failed: {e}")
+            finally:
+                events.task_done()
+
+    for _ in range(max(1, args.workers)):
+        threading.Thread(target=_handler_worker, daemon=True).start()
+
     buf = deque(maxlen=MAX_CONTEXT)
     for line in follow_file(args.log_path):
         buf.append(line)
-        if LEVEL_RE.search(line):
+        if looks_severe(line):
             print(f"[!] Error detected: {line}")
-            try:
-                handle_error(line, list(buf), auto=args.auto)
-            except Exception as e:
-                print(f"[x] Handler failed: {e}")
+            if events.full():
+                # Backpressure: drop the oldest pending event rather than
+                # block the tail and fall behind the log.
+                try:
+                    events.get_nowait()
+                    events.task_done()
+                    print("[x] Event queue full; dropped oldest pending event", file=sys.stderr)
+                except queue.Empty:
+                    pass
+            events.put((line, list(buf)))
 
 if __name__ == "__main__":
     main()
@@ -16,18 +16,26 @@ Usage:
     --openai-model gpt-4o --openai-max-tokens 8 \
     --csv bench_results_heavy.csv
 """
-import argparse, csv, json, math, os, statistics, time
+import argparse, csv, json, os, statistics, time
 from typing import List, Tuple, Dict, Any
 import requests
+from requests.adapters import HTTPAdapter
 
 try:
     from openai import OpenAI  # >=1.x
 except Exception:
     OpenAI = None
 
-def _quantile(values: List[float], q: float) -> float:
-    if not values: return float('nan')
-    s = sorted(values)
+# One pooled session: urllib3 keep-alive reuses the socket across calls
+# instead of paying socket()+connect() (and TLS, for remote hosts) each time.
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+
+def _quantile(s: List[int], q: float) -> float:
+    """Interpolated quantile; `s` must already be sorted (the caller
+    sorts once and reads p50/p90/p95 from the same array)."""
+    if not s: return float('nan')
     idx = (len(s) - 1) * q
     lo, hi = int(idx // 1), int(-(-idx // 1))  # floor, ceil
     if lo == hi: return s[int(idx)]
@@ -39,12 +47,23 @@ def call_ollama(base_url: str, model: str, prompt: str, opts: Dict[str, Any], ti
     # keep_alive must be top-level for Ollama
     if "keep_alive" in payload["options"]:
         payload["keep_alive"] = payload["options"].pop("keep_alive")
-    t0 = time.perf_counter()
-    r = requests.post(url, json=payload, timeout=timeout)
+    t0 = time.perf_counter_ns()
+    r = _SESSION.post(url, json=payload, timeout=timeout)
     r.raise_for_status()
-    elapsed = time.perf_counter() - t0
+    elapsed = time.perf_counter_ns() - t0
     return r.json().get("response", ""), elapsed
 
+# One client per timeout value: OpenAI() re-reads env and builds a fresh
+# HTTP pool each call, so constructing it inside the timed path re-opens
+# TCP+TLS on every run and skews the latency numbers.
+_OAI_CLIENTS: Dict[int, Any] = {}
+
+def _openai_client(timeout: int):
+    client = _OAI_CLIENTS.get(timeout)
+    if client is None:
+        client = _OAI_CLIENTS[timeout] = OpenAI(timeout=timeout)
+    return client
+
 def call_openai(model: str, prompt: str, max_tokens: int, timeout: int = 60):
     """
     Chat Completions call that adapts parameters by model family:
@@ -52,7 +71,7 @@ def call_openai(model: str, prompt: str, max_tokens: int, timeout: int = 60):
       - o3*/o4*: allow temperature; use max_completion_tokens
       - others (e.g., gpt-4o): temperature + max_tokens
     """
-    client = OpenAI(timeout=timeout)
+    client = _openai_client(timeout)
     kwargs = {
         "model": model,
         "messages": [{"role": "user", "content": prompt}],
@@ -67,41 +86,43 @@ def call_openai(model: str, prompt: str, max_tokens: int, timeout: int = 60):
         kwargs["temperature"] = 0.0
         kwargs["max_tokens"] = max_tokens
 
-    t0 = time.perf_counter()
+    t0 = time.perf_counter_ns()
     resp = client.chat.completions.create(**kwargs)
-    return (resp.choices[0].message.content or ""), time.perf_counter() - t0
+    return (resp.choices[0].message.content or ""), time.perf_counter_ns() - t0
 
-def run_many(fn, runs: int, warmup: int) -> List[float]:
+def run_many(fn, runs: int, warmup: int) -> List[int]:
+    # Latencies are integer nanoseconds from perf_counter_ns; a failed
+    # run is recorded as None and filtered out in summarize().
     # Warmups (ignored)
     for _ in range(warmup):
         try: fn()
         except Exception: pass
         time.sleep(0.15)
     # Timed runs
-    out: List[float] = []
+    out: List[int] = []
     for i in range(runs):
         try:
             _txt, t = fn()
             out.append(t)
-            print(f"  run {i+1:02d}: {t*1000:.1f} ms")
+            print(f"  run {i+1:02d}: {t/1e6:.1f} ms")
         except Exception as e:
             print(f"  run {i+1:02d}: ERROR: {e}")
-            out.append(float('nan'))
+            out.append(None)
         time.sleep(0.15)
     return out
 
-def summarize(label: str, xs: List[float]) -> dict:
-    clean = [x for x in xs if math.isfinite(x)]
+def summarize(label: str, xs: List[int]) -> dict:
+    clean = sorted(x for x in xs if x is not None)
     if not clean:
         return {"label": label, "count": 0, "p50_ms": float('nan'), "p90_ms": float('nan'),
                 "p95_ms": float('nan'), "mean_ms": float('nan'), "std_ms": float('nan')}
     return {
         "label": label, "count": len(clean),
-        "p50_ms": _quantile(clean, 0.5) * 1000,
-        "p90_ms": _quantile(clean, 0.9) * 1000,
-        "p95_ms": _quantile(clean, 0.95) * 1000,
-        "mean_ms": statistics.fmean(clean) * 1000,
-        "std_ms": (statistics.pstdev(clean) if len(clean) > 1 else 0.0) * 1000,
+        "p50_ms": _quantile(clean, 0.5) / 1e6,
+        "p90_ms": _quantile(clean, 0.9) / 1e6,
+        "p95_ms": _quantile(clean, 0.95) / 1e6,
+        "mean_ms": statistics.fmean(clean) / 1e6,
+        "std_ms": (statistics.pstdev(clean) if len(clean) > 1 else 0.0) / 1e6,
     }
 
 def main():
@@ -144,11 +165,13 @@ def main():
     for s in (s1, s2):
         print(f"{s['label']:7s} | n={s['count']:2d}  p50={s['p50_ms']:.1f}  p90={s['p90_ms']:.1f}  p95={s['p95_ms']:.1f}  mean={s['mean_ms']:.1f}  std={s['std_ms']:.1f}")
 
-    with open(args.csv, "w", newline="") as f:
+    # Preformat all rows and emit them with one C-level writerows call.
+    rows = [("ollama", i, f"{t/1e6:.3f}" if t is not None else "nan") for i, t in enumerate(t_ollama, 1)]
+    rows += [("openai", i, f"{t/1e6:.3f}" if t is not None else "nan") for i, t in enumerate(t_openai, 1)]
+    with open(args.csv, "w", newline="", buffering=1 << 20) as f:
         w = csv.writer(f)
         w.writerow(["engine", "run_index", "latency_ms"])
-        for i, t in enumerate(t_ollama, 1): w.writerow(["ollama", i, f"{t*1000:.3f}"])
-        for i, t in enumerate(t_openai, 1): w.writerow(["openai", i, f"{t*1000:.3f}"])
+        w.writerows(rows)
     print(f"\n[written] {args.csv}")
 
 if __name__ == "__main__":
@@ -22,7 +22,6 @@ import os
 import sys
 import time
 import json
-import math
 import csv
 from typing import Optional, Tuple, List
 
@@ -32,20 +31,67 @@ except Exception:
     print("This script requires 'requests' (pip install requests)", file=sys.stderr)
     raise
 
+try:
+    import orjson
+    _loads = orjson.loads   # C-accelerated; ~3-5x faster on small chunks
+except Exception:
+    orjson = None
+    _loads = json.loads
+
+from requests.adapters import HTTPAdapter
+
+# One pooled session: urllib3 keep-alive reuses the socket across calls
+# instead of paying socket()+connect() (and TLS, for remote hosts) each time.
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+
 
 # ---------- Log parsing & prompt rendering ----------
 
-def read_last_error_line(log_path: str) -> Tuple[str, int, List[str]]:
-    with open(log_path, 'r', errors='ignore') as f:
-        lines = f.read().splitlines()
-    idx = -1
-    for i in range(len(lines) - 1, -1, -1):
-        if "ERROR" in lines[i]:
-            idx = i
-            break
-    if idx == -1:
-        raise RuntimeError("No line containing 'ERROR' found in log.")
-    return lines[idx], idx, lines
+_SCAN_BLOCK = 64 * 1024
+
+def read_last_error_line(log_path: str, window: int = 0) -> Tuple[str, int, List[str]]:
+    """Find the last line containing 'ERROR' by reading the file tail in
+    64 KiB blocks from the end, instead of loading the whole log. Returns
+    (error_line, index, tail_lines) with index pointing into tail_lines;
+    at least `window` lines before the error are included (or everything
+    back to BOF), so window_context sees the same slice a full read would.
+    """
+    with open(log_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        lines: List[str] = []
+        carry = b""
+        err_from_end = 0  # distance of the error from the end; 0 = not found
+        while pos > 0:
+            step = min(_SCAN_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step) + carry
+            if pos > 0:
+                # Hold the (possibly partial) first line back until the
+                # previous block completes it.
+                nl = block.find(b"\n")
+                if nl == -1:
+                    carry = block
+                    continue
+                carry = block[:nl + 1]
+                block = block[nl + 1:]
+            chunk_lines = block.decode('utf-8', errors='ignore').splitlines()
+            lines[:0] = chunk_lines
+            if not err_from_end:
+                # Newer blocks were scanned first, so the first hit going
+                # backwards is the last error in the file.
+                for i in range(len(chunk_lines) - 1, -1, -1):
+                    if "ERROR" in chunk_lines[i]:
+                        err_from_end = len(lines) - i
+                        break
+            if err_from_end:
+                idx = len(lines) - err_from_end
+                if idx >= window or pos == 0:
+                    return lines[idx], idx, lines
+    raise RuntimeError("No line containing 'ERROR' found in log.")
 
 
 def window_context(lines: List[str], idx: int, window: int) -> List[str]:
@@ -89,7 +135,8 @@ def call_ollama(
 ):
     """
     Calls Ollama /api/generate. Forces format=json for cleaner output.
-    Returns: (text, total_sec, ttfb_sec_or_None)
+    Returns: (text, total_ns, ttfb_ns_or_None) — integer nanoseconds
+    from time.perf_counter_ns(); converted to ms only when reported.
     """
     try:
         o = json.loads(opts) if isinstance(opts, str) else dict(opts or {})
@@ -106,35 +153,58 @@ def call_ollama(
     if "keep_alive" in o:
         payload["keep_alive"] = o["keep_alive"]
 
-    start = time.perf_counter()
+    start = time.perf_counter_ns()
     if measure_ttfb:
         ttfb = None
         acc = []
-        with requests.post(f"{url.rstrip('/')}/api/generate", json=payload, stream=True, timeout=timeout) as r:
+        with _SESSION.post(f"{url.rstrip('/')}/api/generate", json=payload, stream=True, timeout=timeout) as r:
             r.raise_for_status()
-            for line in r.iter_lines(decode_unicode=True):
+            for line in _iter_byte_lines(r):
+                line = line.strip()
                 if not line:
                     continue
                 if ttfb is None:
-                    ttfb = (time.perf_counter() - start)
+                    ttfb = (time.perf_counter_ns() - start)
                 try:
-                    obj = json.loads(line)
+                    obj = _loads(line)
                     piece = obj.get("response", "")
                 except Exception:
-                    piece = line
+                    piece = line.decode('utf-8', errors='ignore')
                 if piece:
                     acc.append(piece)
-        total = (time.perf_counter() - start)
+        total = (time.perf_counter_ns() - start)
         return "".join(acc).strip(), total, ttfb
     else:
-        r = requests.post(f"{url.rstrip('/')}/api/generate", json=payload, timeout=timeout)
+        r = _SESSION.post(f"{url.rstrip('/')}/api/generate", json=payload, timeout=timeout)
         r.raise_for_status()
         obj = r.json()
         text = (obj.get("response") or "").strip()
-        total = (time.perf_counter() - start)
+        total = (time.perf_counter_ns() - start)
         return text, total, None
 
 
+def _iter_byte_lines(r, chunk_size: int = 65536):
+    """Yield complete stream lines as bytes (newline stripped).
+
+    iter_lines(decode_unicode=True) runs a codec pass and a Python-level
+    line splitter over every chunk; pulling raw 64 KiB chunks and
+    splitting on b'\\n' ourselves skips both, and the JSON parser takes
+    the bytes directly.
+    """
+    pending = b""
+    for chunk in r.iter_content(chunk_size=chunk_size):
+        if not chunk:
+            continue
+        pending += chunk
+        if b"\n" not in chunk:
+            continue
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
 def _openai_do_request(headers, body, timeout, stream):
     """
     POST to OpenAI. If HTTP 400:
@@ -145,7 +215,7 @@ def _openai_do_request(headers, body, timeout, stream):
     url = "https://api.openai.com/v1/chat/completions"
 
     def _post(b):
-        return requests.post(url, headers=headers, json=b, stream=stream, timeout=timeout)
+        return _SESSION.post(url, headers=headers, json=b, stream=stream, timeout=timeout)
 
     r = _post(body)
     if r.status_code != 400:
@@ -190,7 +260,8 @@ def call_openai(
 ):
     """
     Calls OpenAI Chat Completions. Uses response_format=json_object when allowed.
-    Returns: (text, total_sec, ttfb_sec_or_None)
+    Returns: (text, total_ns, ttfb_ns_or_None) — integer nanoseconds
+    from time.perf_counter_ns(); converted to ms only when reported.
     """
     api_key = os.environ.get("OPENAI_API_KEY")
     if not api_key:
@@ -213,43 +284,43 @@ def call_openai(
     else:
         body["max_tokens"] = max_tokens
 
-    start = time.perf_counter()
+    start = time.perf_counter_ns()
     if measure_ttfb:
         r = _openai_do_request(headers, body, timeout, stream=True)
         ttfb = None
         chunks = []
-        for raw in r.iter_lines(decode_unicode=True):
+        for raw in _iter_byte_lines(r):
+            raw = raw.strip()
             if not raw:
                 continue
-            if raw.startswith("data: "):
-                data = raw[len("data: "):].strip()
-            else:
-                data = raw.strip()
-            if data == "[DONE]":
+            data = raw.removeprefix(b"data: ")
+            if data == b"[DONE]":
                 break
             try:
-                obj = json.loads(data)
+                obj = _loads(data)
                 delta = obj["choices"][0]["delta"].get("content", "")
             except Exception:
                 delta = ""
             if delta and ttfb is None:
-                ttfb = (time.perf_counter() - start)
+                ttfb = (time.perf_counter_ns() - start)
             if delta:
                 chunks.append(delta)
-        total = (time.perf_counter() - start)
+        total = (time.perf_counter_ns() - start)
         return "".join(chunks).strip(), total, ttfb
     else:
         r = _openai_do_request(headers, body, timeout, stream=False)
         obj = r.json()
-        total = (time.perf_counter() - start)
+        total = (time.perf_counter_ns() - start)
         text = (obj["choices"][0]["message"]["content"] or "").strip()
         return text, total, None
 
 
 # ---------- Stats & CLI ----------
 
-def pct_stats(xs: List[float]):
-    xs = [x for x in xs if x is not None and math.isfinite(x)]
+def pct_stats(xs: List[int]):
+    # Samples are integer nanoseconds; ms formatting happens only here,
+    # so the hot paths never touch float math.
+    xs = [x for x in xs if x is not None]
     if not xs:
         return ("NaN", "NaN", "NaN", "NaN")
     xs.sort()
@@ -265,7 +336,7 @@ def pct_stats(xs: List[float]):
     p90 = pct(0.90)
     mean = sum(xs) / n
     std = (sum((x - mean) ** 2 for x in xs) / (n - 1)) ** 0.5 if n > 1 else 0.0
-    return (f"{p50 * 1000:.1f}", f"{p90 * 1000:.1f}", f"{mean * 1000:.1f}", f"{std * 1000:.1f}")
+    return (f"{p50 / 1e6:.1f}", f"{p90 / 1e6:.1f}", f"{mean / 1e6:.1f}", f"{std / 1e6:.1f}")
 
 
 def main():
@@ -289,7 +360,7 @@ def main():
     args = ap.parse_args()
 
     if args.log:
-        err_line, idx, lines = read_last_error_line(args.log)
+        err_line, idx, lines = read_last_error_line(args.log, args.window)
         ctx_lines = window_context(lines, idx, args.window)
     else:
         err_line = args.error
@@ -354,15 +425,15 @@ def main():
     if args.csv:
         try:
             newfile = not os.path.exists(args.csv)
-            with open(args.csv, 'a', newline='') as f:
+            err_short = (err_line or "")[:120]
+            # Preformat all rows, flush them with one writerows call.
+            rows = [("ollama", f"{t/1e6:.3f}", args.ollama_model, err_short) for t in ollama_totals]
+            rows += [("openai", f"{t/1e6:.3f}", args.openai_model, err_short) for t in openai_totals]
+            with open(args.csv, 'a', newline='', buffering=1 << 20) as f:
                 w = csv.writer(f)
                 if newfile:
                     w.writerow(["engine", "total_ms", "model", "error_preview"])
-                err_short = (err_line or "")[:120]
-                for t in ollama_totals:
-                    w.writerow(["ollama", f"{t*1000:.3f}", args.ollama_model, err_short])
-                for t in openai_totals:
-                    w.writerow(["openai", f"{t*1000:.3f}", args.openai_model, err_short])
+                w.writerows(rows)
             print(f"[written] {args.csv}")
         except Exception as e:
             print(f"[csv error] {e}", file=sys.stderr)